@@ -1,8 +1,10 @@
 from __future__ import annotations
 from abc import ABC
 from dataclasses import dataclass
-from typing import Optional, Tuple
+from typing import List, NamedTuple, Optional, Tuple, Union
+import sys
 import torch
+from torch.nn.utils.rnn import pad_sequence
 import copy
 
 """
@@ -41,23 +43,87 @@ General structure
     ]
 """
 
-@dataclass
+class SemanticKeyInterner:
+    """
+    Interns semantic unique keys (strings) to small int ids. Used to build the
+    packed int64 aggregation keys, so grouping compares machine ints instead of
+    hashing python strings for every hypothesis.
+    """
+    def __init__(self) -> None:
+        self._key_to_id = {}
+        self._id_to_key = []
+
+    def intern(self, key: str) -> int:
+        key_id = self._key_to_id.get(key)
+        if key_id is None:
+            key_id = len(self._id_to_key)
+            self._key_to_id[key] = key_id
+            self._id_to_key.append(key)
+        return key_id
+
+    def lookup(self, key_id: int) -> str:
+        return self._id_to_key[key_id]
+
+
+#: default interner used for all aggregation keys
+AGGREGATION_KEY_INTERNER = SemanticKeyInterner()
+
+
+def pack_aggregation_key(semantic_source_hypothesis_idx: int, key_id: int) -> int:
+    """
+    Pack the composite aggregation key `(semantic_source_hypothesis_idx, key_id)`
+    into a single int64 (`(src << 32) | key_id`). Both components are truncated
+    to 32 bit, which also handles the -1 sentinel indices.
+
+    :param semantic_source_hypothesis_idx: Index of the semantic source hypothesis.
+    :type semantic_source_hypothesis_idx: int
+    :param key_id: Interned id of the semantic data's unique key
+        (see `SemanticKeyInterner`).
+    :type key_id: int
+    :return: Packed composite key.
+    :rtype: int
+    """
+    packed = ((semantic_source_hypothesis_idx & 0xFFFFFFFF) << 32) | (key_id & 0xFFFFFFFF)
+    # fold into the signed int64 range (sentinel indices set the sign bit)
+    if packed >= 0x8000000000000000:
+        packed -= 0x10000000000000000
+    return packed
+
+
+def unpack_aggregation_key(aggregation_key: int) -> Tuple[int, str]:
+    """
+    Reverse of `pack_aggregation_key`. Mainly useful for debugging.
+
+    :param aggregation_key: Packed composite key.
+    :type aggregation_key: int
+    :return: Tuple of the semantic source hypothesis index and the unique key.
+    :rtype: Tuple[int, str]
+    """
+    semantic_source_hypothesis_idx = (aggregation_key >> 32) & 0xFFFFFFFF
+    # sign-extend to recover the -1 sentinel
+    if semantic_source_hypothesis_idx >= 0x80000000:
+        semantic_source_hypothesis_idx -= 0x100000000
+    return semantic_source_hypothesis_idx, AGGREGATION_KEY_INTERNER.lookup(aggregation_key & 0xFFFFFFFF)
+
+
+@dataclass(slots=True)
 class SemanticToken:
     """
     Contains all the data which make up a semantic hypothesis.
 
     :param aggregation_key: Aggregation key of the hypothesis. The aggregation key
-        is a composite key used to group syntactic hypotheses from the same previous 
-        semantic hypothesis. It is constructed as follows:
-        `f"{semantic_source_hypothesis_idx}-{semantic_data.unique_key}"`
-    :type aggregation_key: str
+        is a composite key used to group syntactic hypotheses from the same previous
+        semantic hypothesis. It is packed into a single int64 as follows:
+        `(semantic_source_hypothesis_idx << 32) | interned_id(semantic_data.unique_key)`
+        (see `pack_aggregation_key`).
+    :type aggregation_key: int
     :param token_id: Token id of the semantic token.
     :type token_id: int
     :param score: Score of the hypothesis. Is calculated from the scores of the
         syntactic hypotheses.
     :type score: torch.Tensor
-    :param semantic_source_beam_idx: Index of the semantic source hypothesis in the 
-        beam. Is also the same as the first char in the aggregation key. and the
+    :param semantic_source_beam_idx: Index of the semantic source hypothesis in the
+        beam. Is also the same as the upper 32 bit of the aggregation key. and the
         the same as all `syntactic_hypotheses`'s semantic_source_hypothesis_idx.
     :type semantic_source_beam_idx: int
     :param syntactic_hypotheses: Tuple of syntactic hypotheses that are part of the
@@ -67,7 +133,7 @@ class SemanticToken:
         (as output by the model) and optional, as it is highly unefficient to store.
     :type source_data: Optional[OriginalContinuationData]
     """
-    aggregation_key: str
+    aggregation_key: int
     token_id: torch.Tensor
     score: torch.Tensor
     semantic_source_beam_idx: int
@@ -77,8 +143,16 @@ class SemanticToken:
     def __len__(self) -> int:
         return len(self.syntactic_hypotheses)
 
+    @property
+    def aggregation_key_str(self) -> str:
+        """
+        Human readable form of the packed aggregation key (for debugging).
+        """
+        semantic_source_hypothesis_idx, unique_key = unpack_aggregation_key(self.aggregation_key)
+        return f"{semantic_source_hypothesis_idx}-{unique_key}"
+
     def __repr__(self) -> str:
-        return f"\nSemTok({self.aggregation_key}, {self.token_id}, {self.score}, #{len(self.syntactic_hypotheses)})"
+        return f"\nSemTok({self.aggregation_key_str}, {self.token_id}, {self.score}, #{len(self.syntactic_hypotheses)})"
 
     def __str__(self) -> str:
         return self.__repr__()
@@ -136,7 +210,7 @@ class SemanticToken:
         pkv_device_map: Tuple[torch.device, ...] = None,
     ):
         return SemanticToken(
-            f"e-{semantic_empty_token}",
+            pack_aggregation_key(-1, AGGREGATION_KEY_INTERNER.intern(f"e-{semantic_empty_token}")),
             torch.tensor([semantic_empty_token_id], device=device),
             torch.tensor([empty_score], device=device),
             -1,
@@ -152,16 +226,17 @@ class SemanticToken:
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class SyntacticHypothesis:
     """ 
     Contains all the data necessary to continue the generation of a sequence.
  
     :param aggregation_key: Aggregation key of the hypothesis. The aggregation key
         is a composite key used to group syntactic hypotheses from the same previous
-        semantic hypothesis. It is constructed as follows:
-        `f"{semantic_source_hypothesis_idx}-{semantic_data.unique_key}"`
-    :type aggregation_key: str
+        semantic hypothesis. It is packed into a single int64 as follows:
+        `(semantic_source_hypothesis_idx << 32) | interned_id(semantic_data.unique_key)`
+        (see `pack_aggregation_key`). Use `aggregation_key_str` for a readable form.
+    :type aggregation_key: int
     :param semantic_source_hypothesis_idx: Index of the semantic hypothesis that
         was used to generate the syntactic hypothesis.
     :type semantic_source_hypothesis_idx: torch.Tensor
@@ -195,8 +270,20 @@ class SyntacticHypothesis:
     :type is_aggregation_key_complete: bool, defaults to False
     :param is_normalized_path_score_calculated: Flag to indicate if the normalized path score
     :type is_normalized_path_score_calculated: bool, defaults to False
+    :param _seq_digest: Cached surrogate hash of the sequences tensor. Computed lazily
+        on the device the sequences reside on; only the final 8-byte digest is moved
+        to the host. Do not set manually.
+    :type _seq_digest: Optional[int]
+    :param _len: Cached length of the sequences tensor. Like `_seq_digest`, assumes
+        the sequences tensor is not replaced after the first access. Do not set
+        manually.
+    :type _len: Optional[int]
+    :param _aggregation_key_str: Cached readable form of the aggregation key. Like
+        `_seq_digest`, assumes the aggregation key is not replaced after the first
+        access. Do not set manually.
+    :type _aggregation_key_str: Optional[str]
     """
-    aggregation_key: str
+    aggregation_key: int
     semantic_source_hypothesis_idx: torch.Tensor
     syntactic_source_hypothesis_idx: torch.Tensor
     hypothesis_idx: int
@@ -207,21 +294,67 @@ class SyntacticHypothesis:
     metadata: SyntacticHypothesisMetaData
     is_aggregation_key_complete: bool = False
     is_normalized_path_score_calculated: bool = False
+    _seq_digest: Optional[int] = None
+    _len: Optional[int] = None
+    _aggregation_key_str: Optional[str] = None
+
+    @property
+    def aggregation_key_str(self) -> str:
+        """
+        Human readable form of the packed aggregation key (for debugging).
+        Built lazily, so hypotheses that are pruned before ever being printed
+        never pay for the unpack and string formatting.
+        """
+        if self._aggregation_key_str is None:
+            semantic_source_hypothesis_idx, unique_key = unpack_aggregation_key(self.aggregation_key)
+            self._aggregation_key_str = f"{semantic_source_hypothesis_idx}-{unique_key}"
+        return self._aggregation_key_str
 
     def __len__(self) -> int:
-        return self.syntactic_hypothesis.sequences.shape[-1]
+        if self._len is None:
+            self._len = self.syntactic_hypothesis.sequences.shape[-1]
+        return self._len
 
     def __lt__(self, other: SyntacticHypothesis) -> bool:
         return self.normalized_path_score < other.normalized_path_score
 
     def __eq__(self, other: SyntacticHypothesis) -> bool:
+        # cheap host-side comparisons first (cached length, then cached digest);
+        # `torch.equal` (device op incl. sync) is only needed to rule out a
+        # digest collision
+        if len(self) != len(other):
+            return False
+        if self._sequences_digest() != other._sequences_digest():
+            return False
         return torch.equal(self.syntactic_hypothesis.sequences, other.syntactic_hypothesis.sequences)
 
     def __hash__(self) -> int:
-        return hash(tuple(self.syntactic_hypothesis.sequences.flatten().tolist()))
+        return self._sequences_digest()
+
+    def _sequences_digest(self) -> int:
+        """
+        Surrogate hash over the sequences tensor. The digest is computed on the
+        device of the sequences (avoiding a per-token GPU->CPU sync and python int
+        boxing) and cached, so repeated set/dict probes are O(1).
+        """
+        if self._seq_digest is None:
+            sequences = self.syntactic_hypothesis.sequences
+            if hasattr(torch, "hash_tensor"):
+                self._seq_digest = int(torch.hash_tensor(sequences))
+            else:
+                # fallback: position-dependent mix reduced on-device; a single
+                # 8-byte transfer instead of one python int per token
+                flat = sequences.reshape(-1).to(torch.int64)
+                positions = torch.arange(1, flat.numel() + 1, device=flat.device, dtype=torch.int64)
+                # mix constants pre-folded into signed int64 range; the raw
+                # 64-bit literals overflow when unpacked into a long on torch
+                # versions without `torch.hash_tensor`
+                mixed = (flat + (0x9E3779B97F4A7C15 - (1 << 64))) * positions
+                self._seq_digest = int((mixed * (0xBF58476D1CE4E5B9 - (1 << 64))).sum().item())
+        return self._seq_digest
 
     def __str__(self) -> str:
-        return f"SyntacticHypothesis({self.aggregation_key}, semantic_source_hypothesis_idx={self.semantic_source_hypothesis_idx}, path_score[normalized]={self.path_score}[{self.normalized_path_score}], syntactic_hypothesis={len(self.syntactic_hypothesis)}, metadata={self.metadata}, is_aggr_key_complete={self.is_aggregation_key_complete}, is_norm_path_score_calced={self.is_normalized_path_score_calculated})"
+        return f"SyntacticHypothesis({self.aggregation_key_str}, semantic_source_hypothesis_idx={self.semantic_source_hypothesis_idx}, path_score[normalized]={self.path_score}[{self.normalized_path_score}], syntactic_hypothesis={len(self.syntactic_hypothesis)}, metadata={self.metadata}, is_aggr_key_complete={self.is_aggregation_key_complete}, is_norm_path_score_calced={self.is_normalized_path_score_calculated})"
 
     @classmethod
     def create_empty(
@@ -243,7 +376,7 @@ class SyntacticHypothesis:
         )
 
         return SyntacticHypothesis(
-            f"e-{syntactic_empty_token_id}",
+            pack_aggregation_key(-1, AGGREGATION_KEY_INTERNER.intern(f"e-{syntactic_empty_token_id}")),
             torch.tensor(-1, device=device),
             torch.tensor(-1, device=device),
             -1,
@@ -257,7 +390,7 @@ class SyntacticHypothesis:
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class SemanticData:
     """ 
     Contains data which ties sytactic hypotheses to a semantic hypothesis.
@@ -295,6 +428,15 @@ class SemanticData:
     has_semantic_data: bool = True
     is_eos_token: bool = False
 
+    def __post_init__(self):
+        # unique keys and entity types recur thousands of times across
+        # hypotheses; interning dedupes the storage and lets dict lookups and
+        # equality short-circuit on identity
+        if isinstance(self.unique_key, str):
+            self.unique_key = sys.intern(self.unique_key)
+        if isinstance(self._type, str):
+            self._type = sys.intern(self._type)
+
     def __repr__(self) -> str:
         return f"SemanticData({self.unique_key}, {self.start}, {self.end}, {self._type}, {self.amount_of_chunks}, {'Other: Available' if self.other is not None else 'Other: None'})"
     
@@ -321,14 +463,17 @@ class SemanticData:
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class SyntacticHypothesisData(ABC):
     """ 
     Contains all the sliced data necessary to continue the generation of a sequence.
 
-    :param sequences: Sequence of token ids of shape (, sequnce_length)
+    :param sequences: Sequence of token ids of shape (, sequnce_length). Stored
+        as int32 (every vocab fits) to halve the memory traffic of beam
+        gathers/scatters; upcast to int64 at the model boundary only (see
+        `SyntacticGenerator.unpack_hypotheses`).
     :type sequences: torch.Tensor
-    :param transition_scores: Transition scores of the tokens at generation steps. 
+    :param transition_scores: Transition scores of the tokens at generation steps.
         The transition_scores are not of the same shape as the scores, instead only
         the scores of the hypothesis itself are kept. The shape is therefore
         (, sequence_length). All transition_scores are kept here.
@@ -353,7 +498,8 @@ class SyntacticHypothesisData(ABC):
             head_dim
         )
     :type past_key_values: Tuple[Tuple[torch.Tensor, torch.Tensor], ...]
-    :param attention_mask: Attention mask for the hypothesis.
+    :param attention_mask: Attention mask for the hypothesis. Stored as bool
+        (it is conceptually one), upcast at the model boundary like `sequences`.
     :type attention_mask: torch.Tensor
     """
     sequences: torch.Tensor
@@ -363,6 +509,13 @@ class SyntacticHypothesisData(ABC):
     past_key_values: Optional[Tuple[Tuple[torch.Tensor, torch.Tensor], ...]]
     attention_mask: torch.Tensor
 
+    def __post_init__(self):
+        # compact dtypes for the memory-bound beam reorder paths
+        if self.sequences.dtype != torch.int32:
+            self.sequences = self.sequences.to(torch.int32)
+        if self.attention_mask.dtype != torch.bool:
+            self.attention_mask = self.attention_mask.to(torch.bool)
+
     def __repr__(self) -> str:
         pkv_string = ""
         if self.past_key_values is None:
@@ -389,6 +542,45 @@ class SyntacticHypothesisData(ABC):
         # assert, that the device for key and value is always the same
         assert all(len(set(inner_tuple)) == 1 for inner_tuple in all_devices), "Devices for key and value must be the same, but they are not."
         
+    @staticmethod
+    def pack_past_key_values(
+        past_key_values: Tuple[Tuple[torch.Tensor, torch.Tensor], ...]
+    ) -> torch.Tensor:
+        """
+        Pack nested past key values into one contiguous tensor of shape
+        (num_layers, 2, batch_size, num_heads, sequence_length, head_dim).
+        With a single tensor, reordering beams is one `index_select` on dim 2
+        instead of `2 * num_layers` small per-layer copies. Use
+        `unpack_past_key_values` at the model boundary.
+
+        :param past_key_values: Past key values as nested tuples.
+        :type past_key_values: Tuple[Tuple[torch.Tensor, torch.Tensor], ...]
+        :return: Stacked past key values.
+        :rtype: torch.Tensor
+        """
+        return torch.stack([
+            torch.stack(key_and_value) for key_and_value in past_key_values
+        ])
+
+    @staticmethod
+    def unpack_past_key_values(
+        past_key_values: torch.Tensor
+    ) -> Tuple[Tuple[torch.Tensor, torch.Tensor], ...]:
+        """
+        Reverse of `pack_past_key_values`; restores the nested tuple structure
+        expected by the hf model. The unbound tensors are views, so no copy
+        happens here.
+
+        :param past_key_values: Stacked past key values of shape
+            (num_layers, 2, batch_size, num_heads, sequence_length, head_dim).
+        :type past_key_values: torch.Tensor
+        :return: Past key values as nested tuples.
+        :rtype: Tuple[Tuple[torch.Tensor, torch.Tensor], ...]
+        """
+        return tuple(
+            tuple(torch.unbind(layer, dim=0)) for layer in torch.unbind(past_key_values, dim=0)
+        )
+
     @staticmethod
     def stack_past_key_values(
         past_key_values: Tuple[Tuple[torch.Tensor, torch.Tensor], ...]
@@ -503,7 +695,7 @@ class SyntacticHypothesisData(ABC):
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class SyntacticHypothesisContinuationData(SyntacticHypothesisData):
     unshortened_data: Optional[SyntacticHypothesisUnshortenedContinuationData] = None
 
@@ -517,14 +709,17 @@ class SyntacticHypothesisContinuationData(SyntacticHypothesisData):
 
 
 class SyntacticHypothesisUnshortenedContinuationData(SyntacticHypothesisData):
-    pass    
+    __slots__ = ()    
 
 
-@dataclass
-class SyntacticHypothesisMetaData:
-    """ 
+class SyntacticHypothesisMetaData(NamedTuple):
+    """
     Contains metaddata of the syntactic hypothesis.
-    
+
+    A `NamedTuple` rather than a dataclass since it is never mutated after
+    construction; this skips the dataclass `__init__` machinery for a record
+    that is created once per hypothesis per step.
+
     :param tokens_shortened: Amount of tokens that were shortened after the semantic data point.
         This does not include shortening on the left due to padding minimization.
     :type tokens_shortened: int
@@ -532,8 +727,186 @@ class SyntacticHypothesisMetaData:
     tokens_shortened: int
 
 
+def _topk_by_scores(items: List, scores: List[torch.Tensor], k: Optional[int] = None) -> List:
+    """
+    Order `items` by their score tensors in descending order with a single
+    `torch.topk` instead of a python sort with a tensor-valued `__lt__`
+    comparator (which syncs once per comparison).
+    """
+    if len(items) < 2:
+        return list(items)
+    if k is None:
+        k = len(items)
+    stacked_scores = torch.stack(scores).reshape(len(items))
+    top_indices = torch.topk(stacked_scores, k).indices.tolist()
+    return [items[idx] for idx in top_indices]
+
+
+def topk_semantic_tokens(
+    semantic_tokens: List[SemanticToken],
+    k: Optional[int] = None
+) -> List[SemanticToken]:
+    """
+    The top-k semantic tokens by score, best first. With `k=None` this is a full
+    descending sort (drop-in for `sorted(semantic_tokens, reverse=True)`).
+    """
+    return _topk_by_scores(semantic_tokens, [token.score for token in semantic_tokens], k)
+
+
+def topk_syntactic_hypotheses(
+    hypotheses: List[SyntacticHypothesis],
+    k: Optional[int] = None
+) -> List[SyntacticHypothesis]:
+    """
+    The top-k syntactic hypotheses by normalized path score, best first. With
+    `k=None` this is a full descending sort (drop-in for
+    `sorted(hypotheses, reverse=True)`).
+    """
+    return _topk_by_scores(hypotheses, [hyp.normalized_path_score for hyp in hypotheses], k)
+
+
+class BatchSyntacticHypothesis(NamedTuple):
+    """
+    Structure-of-arrays view on a list of `SyntacticHypothesis`. All per-hypothesis
+    tensors are stacked along a leading batch dimension, so reordering, pruning
+    and scoring of beams become single tensor ops (one gather/topk) instead of
+    B python iterations with B small kernel launches each.
+
+    :param sequences: Token ids of shape (batch_size, sequence_length). Shorter
+        hypotheses are padded on the right.
+    :type sequences: torch.Tensor
+    :param transition_scores: Transition scores of shape (batch_size, sequence_length),
+        padded like `sequences`.
+    :type transition_scores: torch.Tensor
+    :param last_beam_scores: Last beam scores of shape (batch_size,).
+    :type last_beam_scores: torch.Tensor
+    :param attention_mask: Attention mask of shape (batch_size, sequence_length).
+    :type attention_mask: torch.Tensor
+    :param path_score: Path scores of shape (batch_size,).
+    :type path_score: torch.Tensor
+    :param normalized_path_score: Normalized path scores of shape (batch_size,).
+    :type normalized_path_score: torch.Tensor
+    :param semantic_source_hypothesis_idx: Semantic source hypothesis indices of
+        shape (batch_size,).
+    :type semantic_source_hypothesis_idx: torch.Tensor
+    :param aggregation_keys: The packed int64 aggregation keys of the hypotheses
+        of shape (batch_size,) (see `pack_aggregation_key`).
+    :type aggregation_keys: torch.Tensor
+    :param past_key_values: Past key values packed into a single tensor of shape
+        (num_layers, 2, batch_size, num_heads, sequence_length, head_dim)
+        (see `SyntacticHypothesisData.pack_past_key_values`). Optional, as
+        hypotheses may have been stripped of their past key values.
+    :type past_key_values: Optional[torch.Tensor]
+    """
+    sequences: torch.Tensor
+    transition_scores: torch.Tensor
+    last_beam_scores: torch.Tensor
+    attention_mask: torch.Tensor
+    path_score: torch.Tensor
+    normalized_path_score: torch.Tensor
+    semantic_source_hypothesis_idx: torch.Tensor
+    aggregation_keys: torch.Tensor
+    past_key_values: Optional[torch.Tensor]
+
+    def __len__(self) -> int:
+        return self.sequences.shape[0]
+
+    def aggregation_group_indices(self) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Group hypotheses by aggregation key with a single `torch.unique` instead
+        of per-hypothesis dict operations. The returned inverse indices can feed
+        `scatter_add_`/`scatter_reduce_` style reductions over the group scores.
+
+        :return: Tuple of the unique keys and the group index of every hypothesis.
+        :rtype: Tuple[torch.Tensor, torch.Tensor]
+        """
+        return torch.unique(self.aggregation_keys, return_inverse=True)
+
+    @classmethod
+    def batchfy(
+        cls,
+        hypotheses: List[SyntacticHypothesis],
+        pad_token_id: int = 0,
+    ) -> BatchSyntacticHypothesis:
+        """
+        Stack a list of `SyntacticHypothesis` into a single `BatchSyntacticHypothesis`.
+
+        :param hypotheses: Hypotheses to stack.
+        :type hypotheses: List[SyntacticHypothesis]
+        :param pad_token_id: Token id used to pad sequences of different lengths.
+        :type pad_token_id: int
+        :return: Stacked hypotheses.
+        :rtype: BatchSyntacticHypothesis
+        """
+        continuation_data = [hyp.syntactic_hypothesis for hyp in hypotheses]
+        past_key_values = None
+        if all(cont.past_key_values is not None for cont in continuation_data):
+            # (num_layers, 2, batch_size, num_heads, sequence_length, head_dim)
+            past_key_values = torch.cat(
+                [
+                    SyntacticHypothesisData.pack_past_key_values(cont.past_key_values)
+                    for cont in continuation_data
+                ],
+                dim=2
+            )
+        return cls(
+            sequences=pad_sequence(
+                [cont.sequences for cont in continuation_data],
+                batch_first=True,
+                padding_value=pad_token_id
+            ),
+            transition_scores=pad_sequence(
+                [cont.transition_scores for cont in continuation_data],
+                batch_first=True,
+                padding_value=0.0
+            ),
+            last_beam_scores=torch.stack([cont.last_beam_scores for cont in continuation_data]),
+            attention_mask=pad_sequence(
+                [cont.attention_mask for cont in continuation_data],
+                batch_first=True,
+                padding_value=0
+            ),
+            path_score=torch.stack([hyp.path_score for hyp in hypotheses]),
+            normalized_path_score=torch.stack([hyp.normalized_path_score for hyp in hypotheses]),
+            semantic_source_hypothesis_idx=torch.stack(
+                [hyp.semantic_source_hypothesis_idx for hyp in hypotheses]
+            ).to(torch.long),
+            aggregation_keys=torch.tensor(
+                [hyp.aggregation_key for hyp in hypotheses], dtype=torch.int64
+            ),
+            past_key_values=past_key_values,
+        )
+
+    def _batch_select(self, ids: torch.Tensor) -> BatchSyntacticHypothesis:
+        """
+        Select hypotheses with the given batch indices. A single advanced-indexing
+        gather per tensor instead of per-hypothesis slicing.
+
+        :param ids: Indices of the hypotheses to keep, shape (amount_selected,).
+        :type ids: torch.Tensor
+        :return: Batch reduced to the selected hypotheses.
+        :rtype: BatchSyntacticHypothesis
+        """
+        past_key_values = None
+        if self.past_key_values is not None:
+            # one contiguous copy over the batch dim instead of 2 * num_layers
+            # small per-layer gathers
+            past_key_values = self.past_key_values.index_select(2, ids)
+        return BatchSyntacticHypothesis(
+            sequences=self.sequences[ids],
+            transition_scores=self.transition_scores[ids],
+            last_beam_scores=self.last_beam_scores[ids],
+            attention_mask=self.attention_mask[ids],
+            path_score=self.path_score[ids],
+            normalized_path_score=self.normalized_path_score[ids],
+            semantic_source_hypothesis_idx=self.semantic_source_hypothesis_idx[ids],
+            aggregation_keys=self.aggregation_keys[ids],
+            past_key_values=past_key_values,
+        )
+
+
 # legacy dataclasses
-@dataclass
+@dataclass(slots=True)
 class ContinuationData:
     """ 
     Contains all the data necessary to continue the generation of a sequence.
@@ -594,19 +967,62 @@ class ContinuationData:
         return len(self.sequences.shape[-1])
 
 
-@dataclass
+@dataclass(slots=True)
+class KVCacheQuantized:
+    """
+    Int8-quantized (key, value) pair of a single attention layer. Quantization
+    is symmetric with one scale per head, shrinking the stored kv cache 4x
+    (fp32) resp. 2x (fp16/bf16) compared to keeping the raw tensors.
+
+    :param q_key: Quantized key tensor of shape (batch_size, num_heads,
+        sequence_length, head_dim), dtype int8.
+    :type q_key: torch.Tensor
+    :param key_scale: Per-head scales of the key tensor of shape
+        (batch_size, num_heads, 1, 1).
+    :type key_scale: torch.Tensor
+    :param q_value: Quantized value tensor, like `q_key`.
+    :type q_value: torch.Tensor
+    :param value_scale: Per-head scales of the value tensor, like `key_scale`.
+    :type value_scale: torch.Tensor
+    """
+    q_key: torch.Tensor
+    key_scale: torch.Tensor
+    q_value: torch.Tensor
+    value_scale: torch.Tensor
+
+    @classmethod
+    def quantize(cls, key: torch.Tensor, value: torch.Tensor) -> KVCacheQuantized:
+        q_key, key_scale = cls._quantize_tensor(key)
+        q_value, value_scale = cls._quantize_tensor(value)
+        return cls(q_key, key_scale, q_value, value_scale)
+
+    @staticmethod
+    def _quantize_tensor(tensor: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        # symmetric per-head scale over (sequence_length, head_dim)
+        scale = tensor.abs().amax(dim=(-2, -1), keepdim=True).clamp_min(1e-8) / 127.0
+        return (tensor / scale).round().clamp(-127, 127).to(torch.int8), scale
+
+    def dequantize(self) -> Tuple[torch.Tensor, torch.Tensor]:
+        return (
+            self.q_key.to(self.key_scale.dtype) * self.key_scale,
+            self.q_value.to(self.value_scale.dtype) * self.value_scale,
+        )
+
+
+@dataclass(slots=True)
 class OriginalContinuationData:
-    """ 
+    """
     This class contains all the data in raw format (as output by the model).
-    
+
     :param sequences: Sequence of token ids
     :type sequences: torch.Tensor
-    :param scores: Scores of the tokens at generation steps. # of tuples is 
-        equal to the number of tokens generated. The tensor itself is of shape
-        (batch_size, vocab_size).
-    :type scores: Tuple[torch.Tensor]
-    :param transition_scores: Transition scores of the tokens at generation steps.
-    :type transition_scores: Tuple[torch.Tensor]
+    :param scores: Scores of the tokens at generation steps. Either a stacked
+        tensor of shape (num_tokens, batch_size, vocab_size) (see `from_hf`) or
+        the raw hf per-step tuple of (batch_size, vocab_size) tensors.
+    :type scores: Union[torch.Tensor, Tuple[torch.Tensor, ...]]
+    :param transition_scores: Transition scores of the tokens at generation steps,
+        stacked or per-step like `scores`.
+    :type transition_scores: Optional[Union[torch.Tensor, Tuple[torch.Tensor, ...]]]
     :param beam_indices: Indices of the beams that generated the tokens.
     :type beam_indices: torch.Tensor
     :param past_key_values: Past key values for the model. The past key values contain
@@ -620,22 +1036,93 @@ class OriginalContinuationData:
             sequence_length,
             head_dim
         )
-    :type past_key_values: Tuple[Tuple[torch.Tensor, torch.Tensor], ...]
+        May hold `KVCacheQuantized` layers instead (see `quantize_kv`) or be
+        `None` once freed.
+    :type past_key_values: Optional[Union[Tuple[Tuple[torch.Tensor, torch.Tensor], ...], Tuple[KVCacheQuantized, ...]]]
     :param attention_mask: Attention mask for the model.
     :type attention_mask: torch.Tensor
     :param last_beam_scores: Scores of the last beam. Can also be calculated from
-            the scores, sequences and beam indices by using 
+            the scores, sequences and beam indices by using
             `model.compute_transition_scores`. The sum of the
             transition_scores of a beam correspond to the `last_beam_scores`.
-    
+
     """
     sequences: torch.Tensor
-    scores: Tuple[torch.Tensor]
-    transition_scores: Tuple[torch.Tensor]
+    scores: Union[torch.Tensor, Tuple[torch.Tensor, ...]]
+    transition_scores: Optional[Union[torch.Tensor, Tuple[torch.Tensor, ...]]]
     beam_indices: torch.Tensor
-    past_key_values: Tuple[Tuple[torch.Tensor, torch.Tensor], ...]
+    past_key_values: Optional[Union[Tuple[Tuple[torch.Tensor, torch.Tensor], ...], Tuple[KVCacheQuantized, ...]]]
     attention_mask: torch.Tensor
     last_beam_scores: torch.Tensor
+    quantize_kv: bool = False
+
+    def __post_init__(self):
+        if self.quantize_kv:
+            self.quantize_past_key_values()
+
+    @classmethod
+    def from_hf(
+        cls,
+        generation_output,
+        attention_mask: torch.Tensor,
+        last_beam_scores: torch.Tensor,
+        transition_scores: Optional[Tuple[torch.Tensor, ...]] = None,
+        quantize_kv: bool = False,
+    ) -> OriginalContinuationData:
+        """
+        Build from a hf generate output, stacking the per-step `scores` (and
+        `transition_scores`) tuples into single (num_tokens, batch_size, vocab_size)
+        resp. (num_tokens, batch_size) tensors. This avoids keeping num_tokens
+        small python-held tensors around and lets downstream reductions
+        (log_softmax, exp, cumulative sums) run as one kernel over all steps.
+
+        :param generation_output: Output of `model.generate` with
+            `return_dict_in_generate=True` and `output_scores=True`.
+        :param attention_mask: Attention mask used for the generation.
+        :type attention_mask: torch.Tensor
+        :param last_beam_scores: Scores of the last beam.
+        :type last_beam_scores: torch.Tensor
+        :param transition_scores: Per-step transition scores, if computed.
+        :type transition_scores: Optional[Tuple[torch.Tensor, ...]]
+        :param quantize_kv: Quantize the past key values on store (see
+            `KVCacheQuantized`).
+        :type quantize_kv: bool
+        :return: Continuation data with stacked score tensors.
+        :rtype: OriginalContinuationData
+        """
+        return cls(
+            sequences=generation_output.sequences,
+            scores=torch.stack(generation_output.scores),
+            transition_scores=torch.stack(transition_scores) if transition_scores is not None else None,
+            beam_indices=generation_output.beam_indices,
+            past_key_values=generation_output.past_key_values,
+            attention_mask=attention_mask,
+            last_beam_scores=last_beam_scores,
+            quantize_kv=quantize_kv,
+        )
+
+    def quantize_past_key_values(self) -> None:
+        """
+        Replace the stored past key values with int8 per-head quantized copies
+        (see `KVCacheQuantized`). No-op if they are absent or already quantized.
+        """
+        if self.past_key_values is None:
+            return
+        if all(isinstance(layer, KVCacheQuantized) for layer in self.past_key_values):
+            return
+        self.past_key_values = tuple(
+            KVCacheQuantized.quantize(key, value) for key, value in self.past_key_values
+        )
+
+    def dequantized_past_key_values(self) -> Tuple[Tuple[torch.Tensor, torch.Tensor], ...]:
+        """
+        Past key values in the nested-tuple layout expected by the model,
+        dequantizing layers on demand if they were stored quantized.
+        """
+        return tuple(
+            layer.dequantize() if isinstance(layer, KVCacheQuantized) else tuple(layer)
+            for layer in self.past_key_values
+        )
 
     def __repr__(self) -> str:
         return f"OriginalContinuationData(sequences={self.sequences}, scores={self.scores}, transition_scores={self.transition_scores}, beam_indices={self.beam_indices}, past_key_values=<ommited_for_readability>, attention_mask={self.attention_mask}, last_beam_scores={self.last_beam_scores})"
@@ -118,7 +118,11 @@ class Generator:
             semantic_inputs["input_ids"] = semantic_inputs["input_ids"].to(self.first_device)
 
             # setup for greedy search
-            semantic_scores = torch.empty((batch_size,0)).to(self.first_device)
+            # preallocate the score record once and write one column per step;
+            # growing it with torch.cat would reallocate and copy the entire
+            # history every iteration
+            semantic_scores = torch.empty((batch_size, semantic_generation_config.max_overall_tokens)).to(self.first_device)
+            amount_semantic_tokens = 0
             
             last_syntactic_hyps = None
             counter = 0
@@ -245,9 +249,8 @@ class Generator:
 
 
                 semantic_inputs["input_ids"] = torch.cat([semantic_inputs["input_ids"], next_tokens], dim=-1)
-                semantic_scores = torch.cat(
-                    (semantic_scores, next_token_scores), dim=-1
-                )
+                semantic_scores[:, amount_semantic_tokens] = next_token_scores.view(-1)
+                amount_semantic_tokens += 1
 
                 # get the source semantic hyps (tokens) and use their snytactic hyps 
                 # for the next iteration input
@@ -283,7 +286,7 @@ class Generator:
                         else:
                             result_tuple = (
                                 last_semantic_tokens[eos_candidate_idx],
-                                semantic_scores[eos_candidate_idx].clone(),
+                                semantic_scores[eos_candidate_idx, :amount_semantic_tokens].clone(),
                                 semantic_inputs["input_ids"][eos_candidate_idx].clone()
                             )
                             results[eos_candidate_idx] = result_tuple
@@ -417,7 +420,11 @@ class Generator:
                 (batch_size * semantic_generation_config.num_beams,),
                 dtype=torch.float, device=self.first_device
             )
-            semantic_scores = torch.empty((semantic_beam_scores.shape[-1], 0)).to(semantic_beam_scores.device)
+            # preallocate the score record once and write one column per step;
+            # growing it with torch.cat would reallocate and copy the entire
+            # history every iteration
+            semantic_scores = torch.empty((semantic_beam_scores.shape[-1], semantic_generation_config.max_overall_tokens)).to(semantic_beam_scores.device)
+            amount_semantic_tokens = 0
 
             # empty vars to set up
             last_syntactic_hyps = None
@@ -621,10 +628,8 @@ class Generator:
                     next_tokens,
                     replace_nan_with=-float("inf")
                 )
-                semantic_scores = torch.cat(
-                    (semantic_scores, pure_token_scores.flatten().unsqueeze(1)),
-                    dim=-1
-                )
+                semantic_scores[:, amount_semantic_tokens] = pure_token_scores.flatten()
+                amount_semantic_tokens += 1
                 semantic_inputs["input_ids"] = torch.cat([semantic_inputs["input_ids"][semantic_next_beam_indices, :], beam_next_tokens.unsqueeze(-1)], dim=-1)
                 # theoretically: udpate attention_mask as well, but we do not need it
 
@@ -739,7 +744,7 @@ class Generator:
 
             final_semantic_sequences: torch.Tensor = sequence_outputs["sequences"]
             final_semantic_sequences_scores: torch.Tensor  = sequence_outputs["sequence_scores"]
-            final_semantic_scores: torch.Tensor = semantic_scores
+            final_semantic_scores: torch.Tensor = semantic_scores[:, :amount_semantic_tokens]
             final_semantic_beam_indices: torch.Tensor = sequence_outputs["beam_indices"]
             final_semantic_tokens: List[SemanticToken] = sequence_outputs["other"]
 
@@ -829,7 +834,11 @@ class Generator:
                 (batch_size * semantic_generation_config.num_beams,),
                 dtype=torch.float, device=self.first_device
             )
-            semantic_scores = torch.empty((semantic_beam_scores.shape[-1], 0)).to(semantic_beam_scores.device)
+            # preallocate the score record once and write one column per step;
+            # growing it with torch.cat would reallocate and copy the entire
+            # history every iteration
+            semantic_scores = torch.empty((semantic_beam_scores.shape[-1], semantic_generation_config.max_overall_tokens)).to(semantic_beam_scores.device)
+            amount_semantic_tokens = 0
 
             # empty vars to set up
             last_syntactic_hyps = None
@@ -1097,10 +1106,8 @@ class Generator:
                     next_tokens,
                     replace_nan_with=-float("inf")
                 )
-                semantic_scores = torch.cat(
-                    (semantic_scores, pure_token_scores.flatten().unsqueeze(1)),
-                    dim=-1
-                )
+                semantic_scores[:, amount_semantic_tokens] = pure_token_scores.flatten()
+                amount_semantic_tokens += 1
                 semantic_inputs["input_ids"] = torch.cat([semantic_inputs["input_ids"][semantic_next_beam_indices, :], beam_next_tokens.unsqueeze(-1)], dim=-1)
                 # theoretically: udpate attention_mask as well, but we do not need it
 
@@ -1220,7 +1227,7 @@ class Generator:
 
             final_semantic_sequences: torch.Tensor = sequence_outputs["sequences"]
             final_semantic_sequences_scores: torch.Tensor  = sequence_outputs["sequence_scores"]
-            final_semantic_scores: torch.Tensor = semantic_scores
+            final_semantic_scores: torch.Tensor = semantic_scores[:, :amount_semantic_tokens]
             final_semantic_beam_indices: torch.Tensor = sequence_outputs["beam_indices"]
             final_semantic_tokens: List[SemanticToken] = sequence_outputs["other"]
 
@@ -5,7 +5,7 @@ from enum import Enum
 import torch.utils
 
 from semantic_decoding.generators.semantic_model import SemanticModelFactory, SemanticDataModelOutputType
-from semantic_decoding.generators.data_structures import SemanticData, SyntacticHypothesis, SemanticToken, SyntacticHypothesisContinuationData
+from semantic_decoding.generators.data_structures import SemanticData, SyntacticHypothesis, SemanticToken, SyntacticHypothesisContinuationData, topk_semantic_tokens, topk_syntactic_hypotheses
 
 class SemanticTokenizer:
     """ 
@@ -370,7 +370,7 @@ class SemanticGenerator:
                     hyp.semantic_data = semantic_data
                 unique_batch_hyps_w_sem_data[batch_idx].extend(batch_wo_any_sem_data)
 
-        return [sorted(self._create_semantic_hypotheses(batch_hyps), reverse=True) for batch_hyps in unique_batch_hyps_w_sem_data]
+        return [topk_semantic_tokens(self._create_semantic_hypotheses(batch_hyps)) for batch_hyps in unique_batch_hyps_w_sem_data]
 
     def _group_syntactic_hyps_by_sem_source_hyp(
         self,
@@ -399,7 +399,9 @@ class SemanticGenerator:
     def _group_by_aggregation_key(
         self,
         hypotheses: List[SyntacticHypothesis]
-    ) -> Dict[str, SyntacticHypothesis]:
+    ) -> Dict[int, List[SyntacticHypothesis]]:
+        # aggregation keys are packed int64 keys (see `pack_aggregation_key`),
+        # so grouping hashes machine ints instead of composite strings
         aggr_key_dict = {}
         for hypothesis in hypotheses:
             if hypothesis.aggregation_key not in aggr_key_dict.keys():
@@ -437,7 +439,7 @@ class SemanticGenerator:
             semantic_token_id.to(device),
             semantic_score.to(device),
             hypotheses[0].semantic_source_hypothesis_idx,
-            tuple(sorted(hypotheses, reverse=True)),
+            tuple(topk_syntactic_hypotheses(hypotheses)),
             None
         )
 
@@ -4,13 +4,15 @@ from transformers import AutoModelForCausalLM, AutoTokenizer, PreTrainedTokenize
 from transformers.generation.utils import GenerateBeamDecoderOnlyOutput, GenerationConfig
 import torch
 from semantic_decoding.generators.data_structures import (
+    AGGREGATION_KEY_INTERNER,
     ContinuationData,
     OriginalContinuationData,
     SemanticData,
     SyntacticHypothesisContinuationData,
     SyntacticHypothesisUnshortenedContinuationData,
     SyntacticHypothesis,
-    SyntacticHypothesisMetaData
+    SyntacticHypothesisMetaData,
+    pack_aggregation_key,
     )
 
 ModelOutput = Dict[str, Any]
@@ -258,8 +260,11 @@ class SyntacticGenerator:
         self,
         semantic_source_hypothesis: int,
         semantic_data: SemanticData
-    ) -> str:
-        return str(semantic_source_hypothesis) + "-" + semantic_data.unique_key
+    ) -> int:
+        return pack_aggregation_key(
+            semantic_source_hypothesis,
+            AGGREGATION_KEY_INTERNER.intern(semantic_data.unique_key)
+        )
 
     def shorten_hyp_to_first_semantic_data_point(
         self,
@@ -287,7 +292,9 @@ class SyntacticGenerator:
                 path_score = self.compute_path_score(shortened_syn_hyp)
                 no_semantic_data = SemanticData.create_empty(empty_token)
                 is_composite_aggregation_complete = False
-                composite_aggregation_key = no_semantic_data.unique_key
+                composite_aggregation_key = pack_aggregation_key(
+                    -1, AGGREGATION_KEY_INTERNER.intern(no_semantic_data.unique_key)
+                )
                 if semantic_source_hypothesis_indices is not None:
                     composite_aggregation_key = self.gather_composite_aggregation_key(
                         semantic_source_hypothesis_indices[hyp_idx].item(),
@@ -321,7 +328,9 @@ class SyntacticGenerator:
                     hyp
                 )
                 path_score = self.compute_path_score(shortened_syn_hyp)
-                composite_aggregation_key = sem_data.unique_key
+                composite_aggregation_key = pack_aggregation_key(
+                    -1, AGGREGATION_KEY_INTERNER.intern(sem_data.unique_key)
+                )
                 is_composite_aggregation_complete = False
                 if semantic_source_hypothesis_indices is not None:
                     composite_aggregation_key = self.gather_composite_aggregation_key(
@@ -375,7 +384,8 @@ class SyntacticGenerator:
 
             if torch.equal(
                 recomputed_tokens.input_ids[0],
-                hyp_wo_padding[:recomputed_tokens.input_ids.shape[-1]]
+                # sequences are stored int32, the tokenizer returns int64
+                hyp_wo_padding[:recomputed_tokens.input_ids.shape[-1]].to(torch.long)
             ):
                 # if the recomputed sequence is the same as the 
                 # original sequence (wo padding and shortened to first semantic data point)
@@ -387,7 +397,9 @@ class SyntacticGenerator:
                 )
                 path_score = self.compute_path_score(shortened_hyp)
                 is_composite_aggregation_complete = False
-                composite_aggregation_key = sem_data.unique_key
+                composite_aggregation_key = pack_aggregation_key(
+                    -1, AGGREGATION_KEY_INTERNER.intern(sem_data.unique_key)
+                )
                 if semantic_source_hypothesis_indices is not None:
                     composite_aggregation_key = self.gather_composite_aggregation_key(
                         semantic_source_hypothesis_indices[hyp_idx].item(),
@@ -451,7 +463,9 @@ class SyntacticGenerator:
                         path_score = self.compute_path_score(shortened_hyp)
                         
                         is_composite_aggregation_complete = False
-                        composite_aggregation_key = sem_data.unique_key
+                        composite_aggregation_key = pack_aggregation_key(
+                            -1, AGGREGATION_KEY_INTERNER.intern(sem_data.unique_key)
+                        )
                         if semantic_source_hypothesis_indices is not None:
                             composite_aggregation_key = self.gather_composite_aggregation_key(
                                 semantic_source_hypothesis_indices[hyp_idx].item(),
@@ -745,7 +759,7 @@ class SyntacticGenerator:
         current_length = hypothesis.sequences.shape[-1]
         missing_values = target_length - current_length
 
-        sequence_filler = torch.full((missing_values,), pad_token_id).to(hypothesis.sequences.device)
+        sequence_filler = torch.full((missing_values,), pad_token_id, dtype=hypothesis.sequences.dtype).to(hypothesis.sequences.device)
         hypothesis.sequences = torch.cat((sequence_filler, hypothesis.sequences), dim=-1)
 
         # first approach: repeat the first past_key_values
@@ -763,7 +777,7 @@ class SyntacticGenerator:
 
         hypothesis.attention_mask = torch.cat(
             (
-                torch.zeros((missing_values,)).to(hypothesis.attention_mask.device),
+                torch.zeros((missing_values,), dtype=hypothesis.attention_mask.dtype).to(hypothesis.attention_mask.device),
                 hypothesis.attention_mask
             ),
             dim=-1
@@ -781,7 +795,7 @@ class SyntacticGenerator:
         current_length = hypothesis.sequences.shape[-1]
         missing_values = target_length - current_length
 
-        sequence_filler = torch.full((missing_values,), pad_token_id).to(hypothesis.sequences.device)
+        sequence_filler = torch.full((missing_values,), pad_token_id, dtype=hypothesis.sequences.dtype).to(hypothesis.sequences.device)
         sequences = torch.cat((sequence_filler, hypothesis.sequences), dim=-1)
 
         # first approach: repeat the first past_key_values
@@ -796,7 +810,7 @@ class SyntacticGenerator:
 
         attention_mask = torch.cat(
             (
-                torch.zeros((missing_values,)).to(hypothesis.attention_mask.device),
+                torch.zeros((missing_values,), dtype=hypothesis.attention_mask.dtype).to(hypothesis.attention_mask.device),
                 hypothesis.attention_mask
             ),
             dim=-1
@@ -1073,11 +1087,13 @@ class SyntacticGenerator:
         :return: Dictionary of model outputs.
         :rtype: ModelOutput
         """
-        sequences = torch.stack([hyp.sequences for hyp in list_of_hypotheses])
+        # upcast to the dtypes the hf model expects (hypotheses store compact
+        # int32/bool tensors)
+        sequences = torch.stack([hyp.sequences for hyp in list_of_hypotheses]).to(torch.long)
         transition_scores = torch.stack([hyp.transition_scores for hyp in list_of_hypotheses])
         last_beam_scores = torch.stack([hyp.last_beam_scores for hyp in list_of_hypotheses])
         past_key_values = self._reduce_past_key_values([hyp.past_key_values for hyp in list_of_hypotheses])
-        attention_mask = torch.stack([hyp.attention_mask for hyp in list_of_hypotheses])
+        attention_mask = torch.stack([hyp.attention_mask for hyp in list_of_hypotheses]).to(torch.long)
         original_data = None
         if return_original_data and list_of_hypotheses[0].original_data is not None:
             original_data = list_of_hypotheses[0].original_data
@@ -1101,12 +1117,14 @@ class SyntacticGenerator:
                 self.tokenizer.pad_token_id
                 ) for hyp in list_of_hypotheses
         ]
-        sequences = torch.stack([hyp.sequences for hyp in list_of_continuation_data])
+        # upcast to the dtypes the hf model expects (hypotheses store compact
+        # int32/bool tensors)
+        sequences = torch.stack([hyp.sequences for hyp in list_of_continuation_data]).to(torch.long)
         last_beam_scores = torch.stack([hyp.last_beam_scores for hyp in list_of_continuation_data])
         past_key_values = self._reduce_past_key_values_fast([hyp.past_key_values for hyp in list_of_continuation_data])
         for hyp in list_of_continuation_data:
             hyp.past_key_values = None # free pkv vram
-        attention_mask = torch.stack([hyp.attention_mask for hyp in list_of_continuation_data])
+        attention_mask = torch.stack([hyp.attention_mask for hyp in list_of_continuation_data]).to(torch.long)
         return {
             "sequences": sequences,
             "last_beam_scores": last_beam_scores,
@@ -2,27 +2,35 @@ import pickle
 import torch
 import gc
 import time
+from collections import deque
 from typing import Optional, Tuple
 # from tqdm import tqdm
 
 def deep_compare(obj1, obj2, rtol: float = 1e-5):
-    if type(obj1) != type(obj2):
-        return False
-    
-    if isinstance(obj1, torch.Tensor):
-        return torch.allclose(obj1, obj2, rtol=rtol)
-
-    if isinstance(obj1, dict):
-        if obj1.keys() != obj2.keys():
+    # iterative walk (no python recursion); tensors short-circuit on
+    # shape/dtype before any elementwise kernel is launched
+    pending = deque([(obj1, obj2)])
+    while pending:
+        current1, current2 = pending.popleft()
+        if type(current1) != type(current2):
             return False
-        return all(deep_compare(obj1[key], obj2[key]) for key in obj1)
 
-    if isinstance(obj1, list):
-        if len(obj1) != len(obj2):
+        if isinstance(current1, torch.Tensor):
+            if current1.shape != current2.shape or current1.dtype != current2.dtype:
+                return False
+            if not torch.allclose(current1, current2, rtol=rtol):
+                return False
+        elif isinstance(current1, dict):
+            if current1.keys() != current2.keys():
+                return False
+            pending.extend((current1[key], current2[key]) for key in current1)
+        elif isinstance(current1, (list, tuple)):
+            if len(current1) != len(current2):
+                return False
+            pending.extend(zip(current1, current2))
+        elif current1 != current2:
             return False
-        return all(deep_compare(item1, item2) for item1, item2 in zip(obj1, obj2))
-
-    return obj1 == obj2
+    return True
 
 def to_pickle_file(obj, path):
     with open(path, 'ab') as f:
@@ -3,6 +3,7 @@ import torch
 import seaborn as sns
 import matplotlib.pyplot as plt
 import os
+from semantic_decoding.tests.score_differences.utils import load_different_beams_results
 
 current_dir = os.path.dirname(__file__)
 model_names = [
@@ -12,10 +13,8 @@ model_names = [
 ]
 model_name = model_names[0]
 target_file = os.path.join(current_dir, "results", f"different_beams_results_{model_name}.pkl")
-# check if file exists
-if not os.path.exists(target_file):
-    raise FileNotFoundError(f"File {target_file} not found")
-df = pd.read_pickle(target_file)
+# merges the per-prompt frames (and per-gpu rank files) the sweep appends
+df = load_different_beams_results(target_file)
 amount_of_prompts_tested = df["b"].shape[-1]
 print(f"Amount of prompts tested on: {amount_of_prompts_tested}")
 
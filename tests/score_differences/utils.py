@@ -1,5 +1,48 @@
+import os
+import pickle
+
 import torch
 
+def load_different_beams_results(target_file):
+    """
+    Merge the incremental pickle frames written by different_beams.py back into
+    a single `{descriptor: (max_beams, num_prompts)}` tensor dict.
+
+    The sweep appends one frame per prompt (and, when run data-parallel, one
+    `_rank{n}` file per gpu), so frames are read with repeated `pickle.load`
+    until EOFError, concatenated across rank files and ordered by their global
+    prompt index; a prompt swept more than once (e.g. a resumed run) keeps its
+    latest frame. Files in the old single-dict format are returned as-is.
+    """
+    base, ext = os.path.splitext(target_file)
+    candidate_files = [target_file] if os.path.exists(target_file) else []
+    rank = 0
+    while os.path.exists(f"{base}_rank{rank}{ext}"):
+        candidate_files.append(f"{base}_rank{rank}{ext}")
+        rank += 1
+    if not candidate_files:
+        raise FileNotFoundError(f"File {target_file} not found")
+
+    frames = {}
+    for file in candidate_files:
+        with open(file, "rb") as f:
+            while True:
+                try:
+                    frame = pickle.load(f)
+                except EOFError:
+                    break
+                if not isinstance(frame, dict) or "rows" not in frame:
+                    # old format: the file holds one dict of full result tensors
+                    return frame
+                frames[frame["prompt_idx"]] = frame["rows"]
+
+    prompt_indices = sorted(frames)
+    descriptors = frames[prompt_indices[0]].keys()
+    return {
+        desc: torch.stack([frames[idx][desc] for idx in prompt_indices], dim=-1)
+        for desc in descriptors
+    }
+
 def calculate_diff(a, b):
     return torch.abs(a-b)
 
@@ -10,6 +53,10 @@ def average_diff(a, b):
     return torch.mean(calculate_diff(a, b))
 
 def report(a, b, compare_top=False):
+    # upcast so comparisons are always done in fp32, also when the model ran
+    # under bf16 autocast
+    a = a.float()
+    b = b.float()
     maximum_diff = max_diff(a, b)
     avg_diff = average_diff(a, b)
     if compare_top: